@@ -1,286 +1,18 @@
 #!/usr/bin/env python3
 
-tpl = '''# THIS FILE IS AUTOGENERATED -- DO NOT EDIT #
-#   Edit and Re-run .ci/gitlab/template.ci.py instead       #
-
-stages:
-  - sanity
-  - test
-  - build
-  - install_checks
-  - deploy
-
-#************ definition of base jobs *********************************************************************************#
-
-.test_base:
-    retry:
-        max: 2
-        when:
-            - runner_system_failure
-            - stuck_or_timeout_failure
-            - api_failure
-    only: ['branches', 'tags', 'triggers', 'merge-requests']
-    except:
-        - /^staging/.*$/i
-    variables:
-        PYPI_MIRROR_TAG: {{pypi_mirror_tag}}
-        CI_IMAGE_TAG: {{ci_image_tag}}
-
-.pytest:
-    extends: .test_base
-    tags:
-      - long execution time
-    environment:
-        name: unsafe
-    stage: test
-    after_script:
-      - .ci/gitlab/after_script.bash
-    artifacts:
-        name: "$CI_JOB_STAGE-$CI_COMMIT_REF_SLUG"
-        expire_in: 3 months
-        paths:
-            - src/pymortests/testdata/check_results/*/*_changed
-            - coverage.xml
-            - memory_usage.txt
-        reports:
-            junit: test_results.xml
-
-{# note: only Vanilla and numpy runs generate coverage or test_results so we can skip others entirely here #}
-.submit:
-    extends: .test_base
-    retry:
-        max: 2
-        when:
-            - always
-    environment:
-        name: safe
-    except:
-        - /^github\/PR_.*$/
-        - /^staging/.*$/i
-    stage: deploy
-    script: .ci/gitlab/submit.bash
-
-.docker-in-docker:
-    tags:
-      - docker-in-docker
-    extends: .test_base
-    retry:
-        max: 2
-        when:
-            - always
-    {# this is intentionally NOT moving with CI_IMAGE_TAG #}
-    image: pymor/docker-in-docker:d1b5ebb4dc42a77cae82411da2e503a88bb8fb3a
-    variables:
-        DOCKER_HOST: tcp://docker:2375/
-        DOCKER_DRIVER: overlay2
-    before_script:
-        - 'export SHARED_PATH="${CI_PROJECT_DIR}/shared"'
-        - mkdir -p ${SHARED_PATH}
-    services:
-        - docker:dind
-    environment:
-        name: unsafe
-
-
-# this should ensure binderhubs can still build a runnable image from our repo
-.binder:
-    extends: .docker-in-docker
-    stage: install_checks
-    variables:
-        IMAGE: ${CI_REGISTRY_IMAGE}/binder:${CI_COMMIT_REF_SLUG}
-        CMD: "jupyter nbconvert --to notebook --execute /pymor/.ci/ci_dummy.ipynb"
-        USER: juno
-
-.wheel:
-    extends: .docker-in-docker
-    stage: build
-    only: ['branches', 'tags', 'triggers']
-    variables:
-        TEST_OS: "{{ ' '.join(testos) }}"
-    artifacts:
-        paths:
-        # cannot use exported var from env here
-        - ${CI_PROJECT_DIR}/shared/pymor*manylinux*whl
-        expire_in: 1 week
-
-
-.check_wheel:
-    extends: .test_base
-    stage: install_checks
-    services:
-      - pymor/devpi:1
-    dependencies:
-    {%- for PY in pythons %}
-    {%- for ML in manylinuxs %}
-      - "wheel {{ML}} py{{PY[0]}} {{PY[2]}}"
-    {%- endfor %}
-    {%- endfor %}
-    before_script:
-      - pip3 install devpi-client
-      - devpi use http://pymor__devpi:3141/root/public --set-cfg
-      - devpi login root --password none
-      - devpi upload --from-dir --formats=* ./shared
-    only: ['branches', 'tags', 'triggers']
-    # the docker service adressing fails on other runners
-    tags: [mike]
-
-.sanity_checks:
-    extends: .test_base
-    image: pymor/ci_sanity:{{ci_image_tag}}
-    stage: sanity
-#******** end definition of base jobs *********************************************************************************#
-
-#******* sanity stage
-
-# this step makes sure that on older python our install fails with
-# a nice message ala "python too old" instead of "SyntaxError"
-verify setup.py:
-    extends: .sanity_checks
-    script:
-        - python3 setup.py egg_info
-
-ci setup:
-    extends: .sanity_checks
-    script:
-        - ${CI_PROJECT_DIR}/.ci/gitlab/ci_sanity_check.bash "{{ ' '.join(pythons) }}"
-
-#****** test stage
-
-minimal_cpp_demo:
-    extends: .pytest
-    services:
-        - name: pymor/pypi-mirror_stable_py3.7:{{pypi_mirror_tag}}
-          alias: pypi_mirror
-    image: pymor/testing_py3.7:{{ci_image_tag}}
-    script: ./.ci/gitlab/cpp_demo.bash
-
-
-{%- for script, py, para in matrix %}
-{{script}} {{py[0]}} {{py[2]}}:
-    extends: .pytest
-    services:
-    {%- if script == "oldest" %}
-        - name: pymor/pypi-mirror_oldest_py{{py}}:{{pypi_mirror_tag}}
-    {%- else %}
-        - name: pymor/pypi-mirror_stable_py{{py}}:{{pypi_mirror_tag}}
-    {%- endif %}
-          alias: pypi_mirror
-    image: pymor/testing_py{{py}}:{{ci_image_tag}}
-    script: ./.ci/gitlab/test_{{script}}.bash
-{%- endfor %}
-
-{%- for script, py, para in matrix if script in ['vanilla', 'oldest', 'numpy_git'] %}
-submit {{script}} {{py[0]}} {{py[2]}}:
-    extends: .submit
-    image: pymor/python:{{py}}
-    variables:
-        COVERAGE_FLAG: {{script}}
-    dependencies:
-        - {{script}} {{py[0]}} {{py[2]}}
-{%- endfor %}
-
-{% for OS in testos %}
-pip {{loop.index}}/{{loop.length}}:
-    extends: .docker-in-docker
-    stage: install_checks
-    script: docker build -f .ci/docker/install_checks/{{OS}}/Dockerfile .
-{% endfor %}
-
-repo2docker:
-    extends: .binder
-    script:
-        - repo2docker --user-id 2000 --user-name ${USER} --no-run --debug --image-name ${IMAGE} .
-        - docker login -u $CI_REGISTRY_USER -p $CI_REGISTRY_PASSWORD $CI_REGISTRY
-        - docker run ${IMAGE} ${CMD}
-        - docker push ${IMAGE}
-
-local_jupyter:
-    extends: .binder
-    script:
-        - make docker_image
-        - make DOCKER_CMD="${CMD}" docker_exec
-
-{% for url in binder_urls %}
-trigger_binder {{loop.index}}/{{loop.length}}:
-    extends: .test_base
-    stage: deploy
-    image: alpine:3.10
-    only:
-        - master
-        - tags
-    before_script:
-        - apk --update add bash python3
-        - pip3 install requests
-    script:
-        - python3 .ci/gitlab/trigger_binder.py "{{url}}/${CI_COMMIT_REF}"
-{% endfor %}
-
-{%- for PY in pythons %}
-{%- for ML in manylinuxs %}
-wheel {{ML}} py{{PY[0]}} {{PY[2]}}:
-    extends: .wheel
-    variables:
-        PYVER: "{{PY}}"
-    {%- if ML == 1 -%}
-    {# only the ml 1 wheels fail on current runner/docker/os machines#}
-    tags:
-      - amm-old-ci
-    {%- endif %}
-    script: bash .ci/gitlab/wheels.bash {{ML}}
-{% endfor %}
-{% endfor %}
-
-{% for OS in testos %}
-check_wheel {{loop.index}}:
-    extends: .check_wheel
-    image: pymor/deploy_checks:devpi_{{OS}}
-    script: devpi install pymor[full]
-{% endfor %}
-
-pages build:
-    extends: .docker-in-docker
-    stage: build
-    script:
-        - apk --update add make python3
-        - pip3 install jinja2 pathlib
-        - make USER=pymor docker_docs
-    artifacts:
-        paths:
-            - docs/_build/html
-            - docs/error.log
-
-pages:
-    extends: .docker-in-docker
-    stage: deploy
-    resource_group: pages_deploy
-    dependencies:
-        - pages build
-    variables:
-        IMAGE: ${CI_REGISTRY_IMAGE}/docs:latest
-    script:
-        - apk --update add make python3
-        - pip3 install jinja2 pathlib
-        - .ci/gitlab/deploy_docs.bash
-    # only:
-    #   - master
-    #   - tags
-    artifacts:
-        paths:
-            - public
-
-# THIS FILE IS AUTOGENERATED -- DO NOT EDIT #
-#   Edit and Re-run .ci/gitlab/template.ci.py instead       #
-
-'''
-
-
-import os
 import jinja2
-import sys
-from itertools import product
 from pathlib import Path  # python3 only
 from dotenv import dotenv_values
-tpl = jinja2.Template(tpl)
+
+# the template is compiled once by the environment and looked up from its cache afterwards,
+# the compiled bytecode is additionally persisted on disk to skip parsing on subsequent runs
+tpl_dir = Path(__file__).parent
+(tpl_dir / '.jinja_cache').mkdir(exist_ok=True)
+tpl_env = jinja2.Environment(loader=jinja2.FileSystemLoader(str(tpl_dir / 'templates')),
+                             bytecode_cache=jinja2.FileSystemBytecodeCache(str(tpl_dir / '.jinja_cache')),
+                             auto_reload=False, cache_size=-1)
+tpl = tpl_env.get_template('ci.yml.j2')
+
 pythons = ['3.6', '3.7', '3.8']
 oldest = [pythons[0]]
 newest = [pythons[-1]]
@@ -290,11 +22,13 @@ test_scripts = [("mpi", pythons, 1), ("notebooks_dir", pythons, 1),  ("pip_insta
 binder_urls = [f'https://{sub}.mybinder.org/build/gh/pymor/pymor' for sub in ('gke', 'turing', 'gesis')]
 testos = ['centos_8', 'debian_buster', 'debian_testing']
 
-env_path = Path(os.path.dirname(__file__)) / '..' / '..' / '.env'
+env_path = tpl_dir / '..' / '..' / '.env'
 env = dotenv_values(env_path)
 ci_image_tag = env['CI_IMAGE_TAG']
 pypi_mirror_tag = env['PYPI_MIRROR_TAG']
 manylinuxs = [1, 2010, 2014]
-with open(os.path.join(os.path.dirname(__file__), 'ci.yml'), 'wt') as yml:
+with open(tpl_dir / 'ci.yml', 'wt') as yml:
     matrix = [(sc, py, pa) for sc, pythons, pa in test_scripts for py in pythons]
-    yml.write(tpl.render(**locals()))
+    ctx = {'pythons': pythons, 'testos': testos, 'ci_image_tag': ci_image_tag, 'pypi_mirror_tag': pypi_mirror_tag,
+           'manylinuxs': manylinuxs, 'matrix': matrix, 'binder_urls': binder_urls}
+    tpl.stream(ctx).dump(yml)
@@ -2,11 +2,12 @@
 # Copyright 2013-2020 pyMOR developers and contributors. All rights reserved.
 # License: BSD 2-Clause License (http://opensource.org/licenses/BSD-2-Clause)
 
+import numpy as np
 import scipy.linalg as spla
 
 from pymor.algorithms.to_matrix import to_matrix
 from pymor.operators.interface import Operator
-from pymor.operators.constructions import IdentityOperator
+from pymor.operators.constructions import IdentityOperator, LincombOperator
 
 
 def solve_sylv_schur(A, Ar, E=None, Er=None, B=None, Br=None, C=None, Cr=None):
@@ -69,8 +70,8 @@ def solve_sylv_schur(A, Ar, E=None, Er=None, B=None, Br=None, C=None, Cr=None):
     assert isinstance(Ar, Operator) and Ar.linear and Ar.source == Ar.range
 
     assert E is None or isinstance(E, Operator) and E.linear and E.source == E.range == A.source
-    if E is None:
-        E = IdentityOperator(A.source)
+    # the identity is only needed to form the shifted operators, applying it is skipped
+    E_shift = IdentityOperator(A.source) if E is None else E
     assert Er is None or isinstance(Er, Operator) and Er.linear and Er.source == Er.range == Ar.source
 
     compute_V = B is not None and Br is not None
@@ -96,11 +97,21 @@ def solve_sylv_schur(A, Ar, E=None, Er=None, B=None, Br=None, C=None, Cr=None):
         Er = to_matrix(Er, format='dense')
 
     # (Generalized) Schur decomposition
+    # if all eigenvalues are real, the real Schur form is triangular and we can avoid complex arithmetic
     if Er is None:
-        TAr, Z = spla.schur(Ar, output='complex')
+        TAr, Z = spla.schur(Ar, output='real' if np.isrealobj(Ar) else 'complex')
+        if np.any(TAr.diagonal(-1)):
+            TAr, Z = spla.rsf2csf(TAr, Z)
         Q = Z
     else:
-        TAr, TEr, Q, Z = spla.qz(Ar, Er, output='complex')
+        real = np.isrealobj(Ar) and np.isrealobj(Er)
+        TAr, TEr, Q, Z = spla.qz(Ar, Er, output='real' if real else 'complex')
+        if real and np.any(TAr.diagonal(-1)):
+            TAr, TEr, Q, Z = spla.qz(Ar, Er, output='complex')
+
+    # coefficients of the shifted operators, shared by the V and W loops
+    TAr_diag = TAr.diagonal().conjugate()
+    TEr_diag = np.ones(r) if Er is None else TEr.diagonal().conjugate()
 
     # solve for V, from the last column to the first
     if compute_V:
@@ -108,17 +119,22 @@ def solve_sylv_schur(A, Ar, E=None, Er=None, B=None, Br=None, C=None, Cr=None):
 
         BrTQ = Br.apply_adjoint(Br.range.from_numpy(Q.T))
         BBrTQ = B.apply(BrTQ)
+        # each right-hand side is used exactly once, so we can work in-place on views of the block
+        BBrTQ.scal(-1)
         for i in range(-1, -r - 1, -1):
-            rhs = -BBrTQ[i].copy()
+            rhs = BBrTQ[i]
             if i < -1:
                 if Er is not None:
                     rhs -= A.apply(V.lincomb(TEr[i, :i:-1].conjugate()))
-                rhs -= E.apply(V.lincomb(TAr[i, :i:-1].conjugate()))
-            TErii = 1 if Er is None else TEr[i, i]
-            eAaE = TErii.conjugate() * A + TAr[i, i].conjugate() * E
+                if E is None:
+                    rhs -= V.lincomb(TAr[i, :i:-1].conjugate())
+                else:
+                    rhs -= E.apply(V.lincomb(TAr[i, :i:-1].conjugate()))
+            eAaE = LincombOperator([A, E_shift], [TEr_diag[i], TAr_diag[i]])
             V.append(eAaE.apply_inverse(rhs))
 
-        V = V.lincomb(Z.conjugate()[:, ::-1])
+        # V was computed from the last column to the first, pass the reversed coefficients contiguously
+        V = V.lincomb(np.ascontiguousarray(Z.conjugate()[:, ::-1]))
         V = V.real
 
     # solve for W, from the first column to the last
@@ -127,14 +143,17 @@ def solve_sylv_schur(A, Ar, E=None, Er=None, B=None, Br=None, C=None, Cr=None):
 
         CrZ = Cr.apply(Cr.source.from_numpy(Z.T))
         CTCrZ = C.apply_adjoint(CrZ)
+        CTCrZ.scal(-1)
         for i in range(r):
-            rhs = -CTCrZ[i].copy()
+            rhs = CTCrZ[i]
             if i > 0:
                 if Er is not None:
                     rhs -= A.apply_adjoint(W.lincomb(TEr[:i, i]))
-                rhs -= E.apply_adjoint(W.lincomb(TAr[:i, i]))
-            TErii = 1 if Er is None else TEr[i, i]
-            eAaE = TErii.conjugate() * A + TAr[i, i].conjugate() * E
+                if E is None:
+                    rhs -= W.lincomb(TAr[:i, i])
+                else:
+                    rhs -= E.apply_adjoint(W.lincomb(TAr[:i, i]))
+            eAaE = LincombOperator([A, E_shift], [TEr_diag[i], TAr_diag[i]])
             W.append(eAaE.apply_inverse_adjoint(rhs))
 
         W = W.lincomb(Q.conjugate())
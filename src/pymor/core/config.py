@@ -114,6 +114,7 @@ _PACKAGES = {
     'SCIPY_LSMR': lambda: hasattr(import_module('scipy.sparse.linalg'), 'lsmr'),
     'SLYCOT': lambda: _get_slycot_version(),
     'SPHINX': lambda: import_module('sphinx').__version__,
+    'SYMPY': lambda: import_module('sympy').__version__,
 }
 
 
@@ -44,12 +44,13 @@ RENDER_FRAGMENT_SHADER = """
 
 def _normalize(u, vmin=None, vmax=None):
     # rescale to be in [max(0,vmin), min(1,vmax)], scale nan to be the smallest value
-    vmin = np.nanmin(u) if vmin is None else vmin
-    vmax = np.nanmax(u) if vmax is None else vmax
+    # u can be a single frame or a 2d array of frames, each row is rescaled separately
+    vmin = np.nanmin(u, axis=-1, keepdims=True) if vmin is None else vmin
+    vmax = np.nanmax(u, axis=-1, keepdims=True) if vmax is None else vmax
     u -= vmin
-    if (vmax - vmin) > 0:
-        u /= float(vmax - vmin)
-    return np.nan_to_num(u)
+    scale = np.asarray(vmax - vmin, dtype=u.dtype)
+    u /= np.where(scale > 0, scale, 1)
+    return np.nan_to_num(u, copy=False)
 
 
 class Renderer(widgets.VBox):
@@ -67,22 +68,22 @@ class Renderer(widgets.VBox):
 
         if grid.reference_element == triangle:
             if codim == 2:
-                vertices = np.zeros((len(coordinates), 3))
+                vertices = np.zeros((len(coordinates), 3), dtype=np.float32)
                 vertices[:, :-1] = coordinates
                 indices = subentities
             else:
-                vertices = np.zeros((len(subentities) * 3, 3))
+                vertices = np.zeros((len(subentities) * 3, 3), dtype=np.float32)
                 VERTEX_POS = coordinates[subentities]
                 vertices[:, 0:2] = VERTEX_POS.reshape((-1, 2))
                 indices = np.arange(len(subentities) * 3, dtype=np.uint32)
         else:
             if codim == 2:
-                vertices = np.zeros((len(coordinates), 3))
+                vertices = np.zeros((len(coordinates), 3), dtype=np.float32)
                 vertices[:, :-1] = coordinates
                 indices = np.vstack((subentities[:, 0:3], subentities[:, [0, 2, 3]]))
             else:
                 num_entities = len(subentities)
-                vertices = np.zeros((num_entities * 6, 3))
+                vertices = np.zeros((num_entities * 6, 3), dtype=np.float32)
                 VERTEX_POS = coordinates[subentities]
                 vertices[0:num_entities * 3, 0:2] = VERTEX_POS[:, 0:3, :].reshape((-1, 2))
                 vertices[num_entities * 3:, 0:2] = VERTEX_POS[:, [0, 2, 3], :].reshape((-1, 2))
@@ -97,8 +98,10 @@ class Renderer(widgets.VBox):
         )
         self.material = p3js.ShaderMaterial(vertexShader=RENDER_VERTEX_SHADER, fragmentShader=RENDER_FRAGMENT_SHADER, uniforms=uniforms, )
 
-        self.buffer_vertices = p3js.BufferAttribute(vertices.astype(np.float32), normalized=False)
-        self.buffer_faces    = p3js.BufferAttribute(indices.astype(np.uint32).ravel(), normalized=False)
+        # vertices are allocated as float32 already, indices are only copied if their dtype does not match
+        self.buffer_vertices = p3js.BufferAttribute(vertices, normalized=False)
+        self.buffer_faces    = p3js.BufferAttribute(np.ascontiguousarray(indices, dtype=np.uint32).ravel(),
+                                                    normalized=False)
         self.meshes = []
         self._setup_scene(bounding_box, render_size)
         if config.is_nbconvert():
@@ -113,14 +116,18 @@ class Renderer(widgets.VBox):
         self._last_idx = None
         super().__init__(children=[self.renderer, ])
 
-    def _get_mesh(self, u):
+    def _get_vertex_data(self, U):
+        # map all time steps to the vertex ordering of the flattened grid at once
         if self.codim == 2:
-            u = u[self.entity_map]
+            U = U[:, self.entity_map]
         elif self.grid.reference_element == triangle:
-            u = np.repeat(u, 3)
+            U = np.repeat(U, 3, axis=1)
         else:
-            u = np.tile(np.repeat(u, 3), 2)
-        data = p3js.BufferAttribute(_normalize(u, self.vmin, self.vmax), normalized=True)
+            U = np.tile(np.repeat(U, 3, axis=1), 2)
+        return _normalize(U, self.vmin, self.vmax)
+
+    def _get_mesh(self, u):
+        data = p3js.BufferAttribute(u, normalized=True)
         geo = p3js.BufferGeometry(
             index=self.buffer_faces,
             attributes=dict(
@@ -128,17 +135,14 @@ class Renderer(widgets.VBox):
                 data=data
             )
         )
-        mesh = p3js.Mesh(geometry=geo, material=self.material)
-        mesh.visible = False
         # translate to origin where the camera is looking by default, avoids camera not updating in nbconvert run
-        mesh.position = tuple(p-i for p,i in zip(mesh.position, self.mesh_center))
-        return mesh
+        return p3js.Mesh(geometry=geo, material=self.material, position=self.mesh_position, visible=False)
 
     async def _async_load_data(self, data):
         self._load_data(data)
 
     def _load_data(self, data):
-        for u in data:
+        for u in self._get_vertex_data(data):
             m = self._get_mesh(u)
             self.scene.add(m)
             if len(self.meshes) == 0:
@@ -176,6 +180,8 @@ class Renderer(widgets.VBox):
         yhalf = (combined_bounds[1] + combined_bounds[4]) / 2
         zhalf = (combined_bounds[2] + combined_bounds[5]) / 2
         self.mesh_center = (xhalf, yhalf, zhalf)
+        # all time steps share the same geometry, so the offset of their meshes is computed only once
+        self.mesh_position = (-xhalf, -yhalf, -zhalf)
         self.cam = p3js.PerspectiveCamera(aspect=render_size[0] / render_size[1],
                                           position=[0, 0, 0 + self.camera_distance])
         self.light = p3js.AmbientLight(color='white', intensity=1.0)
@@ -216,9 +222,9 @@ class ColorBarRenderer(widgets.VBox):
         bar_padding = font_size // 2
         bar_height = sprite_size[1] - (2*bar_padding)
         # we have to flip the Y coord cause PIL's coordinate system is different from OGL
-        for i in range(bar_height):
-            cl = tuple((np.array(self.color_map(bar_height-i))*255).astype(np.int_))
-            draw.line([(0, bar_padding+i), (bar_width, bar_padding+i)], cl, width=1)
+        colors = (self.color_map(np.arange(bar_height, 0, -1)) * 255).astype(np.int_)
+        for i, cl in enumerate(colors):
+            draw.line([(0, bar_padding+i), (bar_width, bar_padding+i)], tuple(cl), width=1)
 
         text_x = bar_width + 4
         text_color = (0,0,0,255)
@@ -2,11 +2,18 @@
 # Copyright 2013-2020 pyMOR developers and contributors. All rights reserved.
 # License: BSD 2-Clause License (http://opensource.org/licenses/BSD-2-Clause)
 
+import ast
+from functools import lru_cache
+from keyword import iskeyword
+import math
 from numbers import Number
+from operator import itemgetter
+import sys
 
 import numpy as np
 
 from pymor.core.base import abstractmethod
+from pymor.core.config import config
 from pymor.parameters.base import Mu, ParametricObject, Parameters
 from pymor.tools.floatcmp import float_cmp
 
@@ -23,6 +30,24 @@ class ParameterFunctional(ParametricObject):
         """Evaluate the functional for given |parameter values| `mu`."""
         pass
 
+    def evaluate_many(self, mus):
+        """Evaluate the functional for a list of |parameter values|.
+
+        The default implementation calls :meth:`evaluate` for each element
+        of `mus`. Subclasses may override this method with a vectorized
+        implementation.
+
+        Parameters
+        ----------
+        mus
+            List of |parameter values|.
+
+        Returns
+        -------
+        |NumPy array| of the values of the functional for each element of `mus`.
+        """
+        return np.array([self.evaluate(mu) for mu in mus])
+
     def d_mu(self, parameter, index=0):
         """Return the functionals's derivative with respect to a given parameter.
 
@@ -38,7 +63,7 @@ class ParameterFunctional(ParametricObject):
         New |ParameterFunctional| representing the partial derivative.
         """
         if parameter not in self.parameters:
-            return ConstantParameterFunctional(0, name=self.name + '_d_mu')
+            return _zero_functional(self.name + '_d_mu')
         else:
             raise NotImplementedError
 
@@ -91,12 +116,16 @@ class ProjectionParameterFunctional(ParameterFunctional):
         assert self.parameters.assert_compatible(mu)
         return mu[self.parameter].item(self.index)
 
+    def evaluate_many(self, mus):
+        assert all(self.parameters.assert_compatible(mu) for mu in mus)
+        return np.array([mu[self.parameter] for mu in mus]).reshape((len(mus), self.size))[:, self.index]
+
     def d_mu(self, parameter, index=0):
         if parameter == self.parameter:
             assert 0 <= index < self.size
             if index == self.index:
                 return ConstantParameterFunctional(1, name=self.name + '_d_mu')
-        return ConstantParameterFunctional(0, name=self.name + '_d_mu')
+        return _zero_functional(self.name + '_d_mu')
 
 
 class GenericParameterFunctional(ParameterFunctional):
@@ -164,7 +193,7 @@ class GenericParameterFunctional(ParameterFunctional):
                             )
                 else:
                     raise ValueError('derivative expressions do not contain item {}'.format(parameter))
-        return ConstantParameterFunctional(0, name=self.name + '_d_mu')
+        return _zero_functional(self.name + '_d_mu')
 
 
 class ExpressionParameterFunctional(GenericParameterFunctional):
@@ -188,7 +217,8 @@ class ExpressionParameterFunctional(GenericParameterFunctional):
         The name of the functional.
     derivative_expressions
         A dict containing a Python expression for the partial derivatives of each
-        parameter component.
+        parameter component. If `None` and `sympy` is installed, :meth:`d_mu` derives
+        the derivative expressions symbolically from `expression`, whenever possible.
     second_derivative_expressions
         A dict containing a list of dicts of Python expressions for all second order partial derivatives of each
         parameter component i and j.
@@ -205,21 +235,27 @@ class ExpressionParameterFunctional(GenericParameterFunctional):
 
     def __init__(self, expression, parameters, name=None, derivative_expressions=None, second_derivative_expressions=None):
         self.expression = expression
-        code = compile(expression, '<expression>', 'eval')
-        functions = self.functions
-
-        def get_lambda(exp_code):
-            return lambda mu: eval(exp_code, functions, mu)
+        # only valid identifiers can appear in the expression
+        names = tuple(k for k in sorted(parameters) if k.isidentifier() and not iskeyword(k))
+
+        def get_lambda(exp):
+            mapping = _compile_expression(exp, names, type(self))
+            if len(names) == 0:
+                return lambda mu: mapping()
+            elif len(names) == 1:
+                name = names[0]
+                return lambda mu: mapping(mu[name])
+            else:
+                getter = itemgetter(*names)
+                return lambda mu: mapping(*getter(mu))
 
-        exp_mapping = get_lambda(code)
+        exp_mapping = get_lambda(expression)
         if derivative_expressions is not None:
             derivative_mappings = derivative_expressions.copy()
             for (key,exp) in derivative_mappings.items():
                 exp_array = np.array(exp, dtype=object)
-                for exp in np.nditer(exp_array, op_flags=['readwrite'], flags= ['refs_ok']):
-                    exp_code = compile(str(exp), '<expression>', 'eval')
-                    mapping = get_lambda(exp_code)
-                    exp[...] = mapping
+                for index in np.ndindex(exp_array.shape):
+                    exp_array[index] = get_lambda(str(exp_array[index]))
                 derivative_mappings[key] = exp_array
         else:
             derivative_mappings = None
@@ -227,26 +263,148 @@ class ExpressionParameterFunctional(GenericParameterFunctional):
             second_derivative_mappings = second_derivative_expressions.copy()
             for (key_i,key_dicts) in second_derivative_mappings.items():
                 key_dicts_array = np.array(key_dicts, dtype=object)
-                for key_dict in np.nditer(key_dicts_array, op_flags=['readwrite'], flags= ['refs_ok']):
-                    for (key_j, exp) in key_dict[()].items():
+                for index in np.ndindex(key_dicts_array.shape):
+                    # build a new dict, the dicts in second_derivative_expressions must not be modified
+                    key_dict = {}
+                    for (key_j, exp) in key_dicts_array[index].items():
                         exp_array = np.array(exp, dtype=object)
-                        for exp in np.nditer(exp_array, op_flags=['readwrite'], flags= ['refs_ok']):
-                            exp_code = compile(str(exp), '<expression>', 'eval')
-                            mapping = get_lambda(exp_code)
-                            exp[...] = mapping
-                        key_dict[()][key_j] = exp_array
+                        for exp_index in np.ndindex(exp_array.shape):
+                            exp_array[exp_index] = get_lambda(str(exp_array[exp_index]))
+                        key_dict[key_j] = exp_array
+                    key_dicts_array[index] = key_dict
                 second_derivative_mappings[key_i] = key_dicts_array
         else:
             second_derivative_mappings = None
         super().__init__(exp_mapping, parameters, name, derivative_mappings, second_derivative_mappings)
         self.__auto_init(locals())
 
+    def d_mu(self, parameter, index=0):
+        if (self.derivative_expressions is None and self.second_derivative_expressions is None
+                and parameter in self.parameters and config.HAVE_SYMPY):
+            assert 0 <= index < self.parameters[parameter]
+            expression = _derive_expression(self.expression, tuple(sorted(self.parameters.items())),
+                                            parameter, index)
+            if expression == '0':
+                return _zero_functional(self.name + '_d_mu')
+            elif expression is not None:
+                return ExpressionParameterFunctional(expression, self.parameters, name=self.name + '_d_mu')
+        return super().d_mu(parameter, index)
+
     def __reduce__(self):
         return (ExpressionParameterFunctional,
                 (self.expression, self.parameters, getattr(self, '_name', None),
                  self.derivative_expressions, self.second_derivative_expressions))
 
 
+@lru_cache(maxsize=1024)
+def _compile_expression(expression, names, cls):
+    # compile the expression into a function taking the parameter values as arguments,
+    # so that evaluation neither goes through eval nor looks up names in mu;
+    # the function is shared between all functionals with the same expression and parameters
+    compile(expression, '<expression>', 'eval')  # raises SyntaxError if expression is not a single expression
+    code = compile(f'def mapping({", ".join(names)}):\n    return (\n{expression}\n)', '<expression>', 'exec')
+    namespace = {}
+    exec(code, cls.functions, namespace)
+    return namespace['mapping']
+
+
+@lru_cache(maxsize=1024)
+def _derive_expression(expression, parameters, parameter, index):
+    # symbolically derive the partial derivative of expression w.r.t. parameter[index] using sympy;
+    # returns None if sympy cannot handle the expression or if the derivative cannot be expressed
+    # using ExpressionParameterFunctional.functions, and '0' if the derivative vanishes
+    import sympy
+    try:
+        from sympy.printing.numpy import NumPyPrinter
+    except ImportError:
+        from sympy.printing.pycode import NumPyPrinter
+
+    tree = ast.parse(expression, mode='eval')
+    sizes = {name: size for name, size in parameters if name.isidentifier() and not iskeyword(name)}
+    names = set(sizes)
+    if not _sympy_compatible(tree, sizes):
+        return None
+    # parameters which are used without subscript are only supported when they are scalar
+    subscripted = {id(node.value) for node in ast.walk(tree) if isinstance(node, ast.Subscript)}
+    unsubscripted = {node.id for node in ast.walk(tree)
+                     if isinstance(node, ast.Name) and id(node) not in subscripted}
+    if any(size != 1 for name, size in parameters if name in names & unsubscripted):
+        return None
+    if parameter not in names:
+        return '0'
+    symbols = {name: sympy.Symbol(name, real=True) if name in unsubscripted else sympy.IndexedBase(name, real=True)
+               for name in names}
+
+    try:
+        exp = sympy.sympify(expression, locals=dict(_sympy_functions(), **symbols))
+        symbol = symbols[parameter] if parameter in unsubscripted else symbols[parameter][index]
+        derivative = sympy.diff(exp, symbol)
+        if derivative == 0:
+            return '0'
+        derivative = NumPyPrinter({'fully_qualified_modules': False}).doprint(derivative)
+        used_names = {node.id for node in ast.walk(ast.parse(derivative, mode='eval')) if isinstance(node, ast.Name)}
+    except (sympy.SympifyError, TypeError, SyntaxError, NotImplementedError):
+        # NotImplementedError is raised when the derivative contains functions the printer does not support
+        return None
+    if not used_names <= set(ExpressionParameterFunctional.functions) | names:
+        return None
+    return derivative
+
+
+# functions of ExpressionParameterFunctional.functions which sympy evaluates like NumPy, with their number of
+# arguments, and the corresponding constants
+_SYMPY_COMPATIBLE_FUNCTIONS = dict({f: 1 for f in ('sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan',
+                                                   'sinh', 'cosh', 'tanh', 'arcsinh', 'arccosh', 'arctanh',
+                                                   'exp', 'exp2', 'log', 'log2', 'log10', 'sqrt', 'abs', 'sign')},
+                                   arctan2=2)
+_SYMPY_COMPATIBLE_CONSTANTS = {'pi', 'e'}
+
+# syntax which sympy interprets like Python; sympify reads e.g. `^` as power, not as xor
+# (Num and Index nodes are only produced by older Python versions and are deprecated since Python 3.12)
+_SYMPY_COMPATIBLE_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Subscript, ast.Constant,
+                           ast.Load, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.UAdd, ast.USub)
+if sys.version_info < (3, 9):
+    _SYMPY_COMPATIBLE_NODES += tuple(node for node in (getattr(ast, name, None) for name in ('Num', 'Index'))
+                                     if node is not None)
+
+
+def _sympy_compatible(tree, sizes):
+    # sizes maps the names of the parameters to their sizes
+    called = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    for node in ast.walk(tree):
+        if not isinstance(node, _SYMPY_COMPATIBLE_NODES):
+            return False
+        if isinstance(node, ast.Name) and not (node.id in _SYMPY_COMPATIBLE_FUNCTIONS if id(node) in called else
+                                               node.id in sizes or node.id in _SYMPY_COMPATIBLE_CONSTANTS):
+            return False
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords
+                                           or _SYMPY_COMPATIBLE_FUNCTIONS.get(node.func.id) != len(node.args)):
+            return False
+        if isinstance(node, ast.Subscript):
+            index = node.slice.value if type(node.slice).__name__ == 'Index' else node.slice
+            index = _constant_value(index)
+            if (not isinstance(node.value, ast.Name) or node.value.id not in sizes
+                    or type(index) is not int or not 0 <= index < sizes[node.value.id]):
+                return False
+        if type(node).__name__ in ('Constant', 'Num') and not isinstance(_constant_value(node), Number):
+            return False
+    return True
+
+
+def _constant_value(node):
+    # the value of a Constant node (or of a Num node for Python < 3.8), None for other nodes
+    return node.value if isinstance(node, ast.Constant) else getattr(node, 'n', None)
+
+
+def _sympy_functions():
+    # sympy counterparts of those ExpressionParameterFunctional.functions which are named differently
+    import sympy
+    return {'arcsin': sympy.asin, 'arccos': sympy.acos, 'arctan': sympy.atan, 'arctan2': sympy.atan2,
+            'arcsinh': sympy.asinh, 'arccosh': sympy.acosh, 'arctanh': sympy.atanh, 'abs': sympy.Abs,
+            'exp2': lambda x: 2**x, 'log2': lambda x: sympy.log(x, 2), 'log10': lambda x: sympy.log(x, 10),
+            'e': sympy.E}
+
+
 class ProductParameterFunctional(ParameterFunctional):
     """Forms the product of a list of |ParameterFunctionals| or numbers.
 
@@ -259,13 +417,36 @@ class ProductParameterFunctional(ParameterFunctional):
     """
 
     def __init__(self, factors, name=None):
+        factors = tuple(factors)
         assert len(factors) > 0
         assert all(isinstance(f, (ParameterFunctional, Number)) for f in factors)
         self.__auto_init(locals())
+        # multiply all numbers and constant functionals into a single constant,
+        # so that only the remaining functionals have to be evaluated
+        const = 1
+        for f in factors:
+            if isinstance(f, Number):
+                const *= f
+            elif isinstance(f, ConstantParameterFunctional):
+                const *= f.constant_value
+        self._const = const
+        self._functionals = tuple(f for f in factors
+                                  if isinstance(f, ParameterFunctional)
+                                  and not isinstance(f, ConstantParameterFunctional))
 
     def evaluate(self, mu=None):
         assert self.parameters.assert_compatible(mu)
-        return np.array([f.evaluate(mu) if hasattr(f, 'evaluate') else f for f in self.factors]).prod()
+        value = self._const
+        for f in self._functionals:
+            value *= f.evaluate(mu)
+        return value
+
+    def evaluate_many(self, mus):
+        assert all(self.parameters.assert_compatible(mu) for mu in mus)
+        values = np.full(len(mus), self._const)
+        for f in self._functionals:
+            values = values * f.evaluate_many(mus)
+        return values
 
 
 class ConjugateParameterFunctional(ParameterFunctional):
@@ -310,8 +491,17 @@ class ConstantParameterFunctional(ParameterFunctional):
     def evaluate(self, mu=None):
         return self.constant_value
 
+    def evaluate_many(self, mus):
+        return np.full(len(mus), self.constant_value)
+
     def d_mu(self, parameter, index=0):
-        return self.with_(constant_value=0, name=self.name + '_d_mu')
+        return _zero_functional(self.name + '_d_mu')
+
+
+@lru_cache(maxsize=1024)
+def _zero_functional(name):
+    # vanishing derivatives are requested frequently, functionals are immutable and can be shared
+    return ConstantParameterFunctional(0, name=name)
 
 
 class MinThetaParameterFunctional(ParameterFunctional):
@@ -357,21 +547,42 @@ class MinThetaParameterFunctional(ParameterFunctional):
         assert all([isinstance(theta, (Number, ParameterFunctional)) for theta in thetas])
         thetas = tuple(ConstantParameterFunctional(theta) if not isinstance(theta, ParameterFunctional) else theta
                        for theta in thetas)
+        parameters = Parameters.of(thetas)
         if not isinstance(mu_bar, Mu):
-            mu_bar = Parameters.of(thetas).parse(mu_bar)
-        assert Parameters.of(thetas).assert_compatible(mu_bar)
+            mu_bar = parameters.parse(mu_bar)
+        assert parameters.assert_compatible(mu_bar)
         thetas_mu_bar = np.array([theta(mu_bar) for theta in thetas])
         assert np.all(thetas_mu_bar > 0)
         assert isinstance(alpha_mu_bar, Number)
         assert alpha_mu_bar > 0
         self.__auto_init(locals())
         self.thetas_mu_bar = thetas_mu_bar
+        # the ratio of a constant theta is always one, so only the remaining thetas have to be evaluated
+        self._nonconstant_thetas = tuple((theta, theta_mu_bar_inv)
+                                         for theta, theta_mu_bar_inv in zip(thetas, (1. / thetas_mu_bar).tolist())
+                                         if not isinstance(theta, ConstantParameterFunctional))
+        self._constant_ratio = 1. if len(self._nonconstant_thetas) < len(thetas) else math.inf
 
     def evaluate(self, mu=None):
         assert self.parameters.assert_compatible(mu)
-        thetas_mu = np.array([theta(mu) for theta in self.thetas])
-        assert np.all(thetas_mu > 0)
-        return self.alpha_mu_bar * np.min(thetas_mu / self.thetas_mu_bar)
+        # Q is usually small, so a single loop without temporary arrays is fastest
+        min_ratio = self._constant_ratio
+        for theta, theta_mu_bar_inv in self._nonconstant_thetas:
+            theta_mu = theta(mu)
+            assert theta_mu > 0
+            ratio = theta_mu * theta_mu_bar_inv
+            if ratio < min_ratio:
+                min_ratio = ratio
+        return self.alpha_mu_bar * min_ratio
+
+    def evaluate_many(self, mus):
+        assert all(self.parameters.assert_compatible(mu) for mu in mus)
+        min_ratios = np.full(len(mus), self._constant_ratio)
+        for theta, theta_mu_bar_inv in self._nonconstant_thetas:
+            thetas_mu = theta.evaluate_many(mus)
+            assert np.all(thetas_mu > 0)
+            np.minimum(min_ratios, thetas_mu * theta_mu_bar_inv, out=min_ratios)
+        return self.alpha_mu_bar * min_ratios
 
 
 class MaxThetaParameterFunctional(ParameterFunctional):
@@ -391,18 +602,18 @@ class MaxThetaParameterFunctional(ParameterFunctional):
     The max-theta approach from [Haa17]_ (Exercise 5.12) allows to obtain a computable bound for the continuity
     constant of a(., ., mu) or l(., mu) for arbitrary parameters mu, since ::
 
-      a(u, v, mu=mu) <= |max_{q = 1}^Q theta_q(mu)/theta_q(mu_bar)|  |a(u, v, mu=mu_bar)|
+      a(u, v, mu=mu) <= max_{q = 1}^Q |theta_q(mu)/theta_q(mu_bar)|  |a(u, v, mu=mu_bar)|
 
     or ::
 
-      l(v, mu=mu) <= |max_{q = 1}^Q theta_q(mu)/theta_q(mu_bar)| |l(v, mu=mu_bar)|,
+      l(v, mu=mu) <= max_{q = 1}^Q |theta_q(mu)/theta_q(mu_bar)| |l(v, mu=mu_bar)|,
 
     if all theta_q(mu_bar) != 0.
 
     Given a list of the thetas, the |parameter values| mu_bar and the constant gamma_mu_bar, this functional thus evaluates
     to ::
 
-      gamma_mu_bar * max{q = 1}^Q theta_q(mu)/theta_q(mu_bar)
+      gamma_mu_bar * max_{q = 1}^Q |theta_q(mu)/theta_q(mu_bar)|
 
 
     Parameters
@@ -423,18 +634,38 @@ class MaxThetaParameterFunctional(ParameterFunctional):
         assert all([isinstance(theta, (Number, ParameterFunctional)) for theta in thetas])
         thetas = tuple(ConstantParameterFunctional(f) if not isinstance(f, ParameterFunctional) else f
                        for f in thetas)
+        parameters = Parameters.of(thetas)
         if not isinstance(mu_bar, Mu):
-            mu_bar = Parameters.of(thetas).parse(mu_bar)
-        assert Parameters.of(thetas).assert_compatible(mu_bar)
+            mu_bar = parameters.parse(mu_bar)
+        assert parameters.assert_compatible(mu_bar)
         thetas_mu_bar = np.array([theta(mu_bar) for theta in thetas])
         assert not np.any(float_cmp(thetas_mu_bar, 0))
         assert isinstance(gamma_mu_bar, Number)
         assert gamma_mu_bar > 0
         self.__auto_init(locals())
         self.thetas_mu_bar = thetas_mu_bar
+        # the ratio of a constant theta is always one, so only the remaining thetas have to be evaluated
+        self._nonconstant_thetas = tuple((theta, theta_mu_bar_inv)
+                                         for theta, theta_mu_bar_inv in zip(thetas, (1. / thetas_mu_bar).tolist())
+                                         if not isinstance(theta, ConstantParameterFunctional))
+        self._constant_ratio = 1. if len(self._nonconstant_thetas) < len(thetas) else 0.
 
     def evaluate(self, mu=None):
         assert self.parameters.assert_compatible(mu)
-        thetas_mu = np.array([theta(mu) for theta in self.thetas])
-        assert np.all(np.logical_or(thetas_mu < 0, thetas_mu > 0))
-        return self.gamma_mu_bar * np.abs(np.max(thetas_mu / self.thetas_mu_bar))
+        max_ratio = self._constant_ratio
+        for theta, theta_mu_bar_inv in self._nonconstant_thetas:
+            theta_mu = theta(mu)
+            assert theta_mu < 0 or theta_mu > 0
+            ratio = abs(theta_mu * theta_mu_bar_inv)
+            if ratio > max_ratio:
+                max_ratio = ratio
+        return self.gamma_mu_bar * max_ratio
+
+    def evaluate_many(self, mus):
+        assert all(self.parameters.assert_compatible(mu) for mu in mus)
+        max_ratios = np.full(len(mus), self._constant_ratio)
+        for theta, theta_mu_bar_inv in self._nonconstant_thetas:
+            thetas_mu = theta.evaluate_many(mus)
+            assert np.all(np.logical_or(thetas_mu < 0, thetas_mu > 0))
+            np.maximum(max_ratios, np.abs(thetas_mu * theta_mu_bar_inv), out=max_ratios)
+        return self.gamma_mu_bar * max_ratios
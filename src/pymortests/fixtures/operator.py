@@ -2,14 +2,24 @@
 # Copyright 2013-2020 pyMOR developers and contributors. All rights reserved.
 # License: BSD 2-Clause License (http://opensource.org/licenses/BSD-2-Clause)
 
+from functools import lru_cache
+
 import numpy as np
 from numpy.polynomial.polynomial import Polynomial
 import pytest
 
+from pymor.analyticalproblems.thermalblock import thermal_block_problem
 from pymor.core.config import config
+from pymor.discretizers.builtin import discretize_stationary_cg
+from pymor.operators.block import BlockColumnOperator, BlockDiagonalOperator, BlockOperator, BlockRowOperator
+from pymor.operators.constructions import (AdjointOperator, ComponentProjection, ConstantOperator,
+                                           FixedParameterOperator, IdentityOperator, SelectionOperator,
+                                           VectorArrayOperator, VectorFunctional, VectorOperator, ZeroOperator)
 from pymor.operators.interface import Operator
 from pymor.operators.list import NumpyListVectorArrayMatrixOperator
-from pymor.operators.numpy import NumpyMatrixOperator
+from pymor.operators.numpy import NumpyGenericOperator, NumpyMatrixOperator
+from pymor.parameters.functionals import ProjectionParameterFunctional
+from pymor.tools.random import get_random_state
 from pymor.vectorarrays.numpy import NumpyVectorSpace
 
 
@@ -34,16 +44,16 @@ class MonomOperator(Operator):
 
 
 def random_integers(count, seed):
-    np.random.seed(seed)
-    return list(np.random.randint(0, 3200, count))
+    return get_random_state(seed=seed).randint(0, 3200, count).tolist()
 
 
 def numpy_matrix_operator_with_arrays_factory(dim_source, dim_range, count_source, count_range, seed,
-                                              source_id=None, range_id=None):
-    np.random.seed(seed)
-    op = NumpyMatrixOperator(np.random.random((dim_range, dim_source)), source_id=source_id, range_id=range_id)
-    s = op.source.make_array(np.random.random((count_source, dim_source)))
-    r = op.range.make_array(np.random.random((count_range, dim_range)))
+                                              source_id=None, range_id=None, random_state=None):
+    random_state = get_random_state(random_state, seed)
+    op = NumpyMatrixOperator(random_state.random_sample((dim_range, dim_source)),
+                             source_id=source_id, range_id=range_id)
+    s = op.source.make_array(random_state.random_sample((count_source, dim_source)))
+    r = op.range.make_array(random_state.random_sample((count_range, dim_range)))
     return op, None, s, r
 
 
@@ -60,27 +70,20 @@ def numpy_list_vector_array_matrix_operator_with_arrays_factory(
 
 
 def numpy_matrix_operator_with_arrays_and_products_factory(dim_source, dim_range, count_source, count_range, seed,
-                                                           source_id=None, range_id=None):
-    from scipy.linalg import eigh
-    op, _, U, V = numpy_matrix_operator_with_arrays_factory(dim_source, dim_range, count_source, count_range, seed,
-                                                            source_id=source_id, range_id=range_id)
+                                                           source_id=None, range_id=None, random_state=None):
+    random_state = get_random_state(random_state, seed)
+    op, _, U, V = numpy_matrix_operator_with_arrays_factory(dim_source, dim_range, count_source, count_range, None,
+                                                            source_id=source_id, range_id=range_id,
+                                                            random_state=random_state)
     if dim_source > 0:
-        while True:
-            sp = np.random.random((dim_source, dim_source))
-            sp = sp.T.dot(sp)
-            evals = eigh(sp, eigvals_only=True)
-            if np.min(evals) > 1e-6:
-                break
+        sp = random_state.random_sample((dim_source, dim_source))
+        sp = sp.T.dot(sp) + 1e-6 * np.eye(dim_source)
         sp = NumpyMatrixOperator(sp, source_id=source_id, range_id=source_id)
     else:
         sp = NumpyMatrixOperator(np.zeros((0, 0)), source_id=source_id, range_id=source_id)
     if dim_range > 0:
-        while True:
-            rp = np.random.random((dim_range, dim_range))
-            rp = rp.T.dot(rp)
-            evals = eigh(rp, eigvals_only=True)
-            if np.min(evals) > 1e-6:
-                break
+        rp = random_state.random_sample((dim_range, dim_range))
+        rp = rp.T.dot(rp) + 1e-6 * np.eye(dim_range)
         rp = NumpyMatrixOperator(rp, source_id=range_id, range_id=range_id)
     else:
         rp = NumpyMatrixOperator(np.zeros((0, 0)), source_id=range_id, range_id=range_id)
@@ -116,23 +119,33 @@ numpy_list_vector_array_matrix_operator_generators = \
 
 
 def thermalblock_factory(xblocks, yblocks, diameter, seed):
-    from pymor.analyticalproblems.functions import GenericFunction
-    from pymor.analyticalproblems.thermalblock import thermal_block_problem
-    from pymor.discretizers.builtin import discretize_stationary_cg
-    from pymor.discretizers.builtin.cg import InterpolationOperator
+    return _thermalblock_factory(xblocks, yblocks, diameter, seed)[:6]
+
+
+def _thermalblock_factory(xblocks, yblocks, diameter, seed):
+    # additionally returns the random state after generating the arrays,
+    # for the factories which need further random data
+    op, mu, U, V, sp, rp, state = _thermalblock_data(xblocks, yblocks, diameter, seed)
+    random_state = np.random.RandomState()
+    random_state.set_state(state)
+    return op, mu, U.copy(deep=True), V.copy(deep=True), sp, rp, random_state
+
+
+@lru_cache(maxsize=2)
+def _thermalblock_data(xblocks, yblocks, diameter, seed):
+    # discretizing the problem is expensive, so it is done only once per set of arguments;
+    # maxsize covers the two small discretizations for thermalblock_factory_arguments;
+    # op, sp and rp are shared between all fixtures using them and must not be modified,
+    # U and V are only handed out as copies
     p = thermal_block_problem((xblocks, yblocks))
     m, m_data = discretize_stationary_cg(p, diameter)
-    f = GenericFunction(lambda X, mu: X[..., 0]**mu['exp'][0] + X[..., 1],
-                        dim_domain=2, parameters={'exp': 1})
-    iop = InterpolationOperator(m_data['grid'], f)
-    U = m.operator.source.empty()
-    V = m.operator.range.empty()
-    np.random.seed(seed)
-    for exp in np.random.random(5):
-        U.append(iop.as_vector(f.parameters.parse(exp)))
-    for exp in np.random.random(6):
-        V.append(iop.as_vector(f.parameters.parse(exp)))
-    return m.operator, p.parameter_space.sample_randomly(1, seed=seed)[0], U, V, m.h1_product, m.l2_product
+    # P1-interpolations of x**exp + y for random exponents, all computed at once
+    X = m_data['grid'].centers(2)
+    random_state = get_random_state(seed=seed)
+    U = m.operator.source.make_array(X[:, 0] ** random_state.random_sample(5)[:, np.newaxis] + X[:, 1])
+    V = m.operator.range.make_array(X[:, 0] ** random_state.random_sample(6)[:, np.newaxis] + X[:, 1])
+    return (m.operator, p.parameter_space.sample_randomly(1, seed=seed)[0], U, V, m.h1_product, m.l2_product,
+            random_state.get_state())
 
 
 def thermalblock_assemble_factory(xblocks, yblocks, diameter, seed):
@@ -141,67 +154,59 @@ def thermalblock_assemble_factory(xblocks, yblocks, diameter, seed):
 
 
 def thermalblock_concatenation_factory(xblocks, yblocks, diameter, seed):
-    from pymor.operators.constructions import Concatenation
     op, mu, U, V, sp, rp = thermalblock_factory(xblocks, yblocks, diameter, seed)
     op = sp @ op
     return op, mu, U, V, sp, rp
 
 
 def thermalblock_identity_factory(xblocks, yblocks, diameter, seed):
-    from pymor.operators.constructions import IdentityOperator
     _, _, U, V, sp, rp = thermalblock_factory(xblocks, yblocks, diameter, seed)
     return IdentityOperator(U.space), None, U, V, sp, rp
 
 
 def thermalblock_zero_factory(xblocks, yblocks, diameter, seed):
-    from pymor.operators.constructions import ZeroOperator
     _, _, U, V, sp, rp = thermalblock_factory(xblocks, yblocks, diameter, seed)
     return ZeroOperator(V.space, U.space), None, U, V, sp, rp
 
 
 def thermalblock_constant_factory(xblocks, yblocks, diameter, seed):
-    from pymor.operators.constructions import ConstantOperator
     _, _, U, V, sp, rp = thermalblock_factory(xblocks, yblocks, diameter, seed)
     return ConstantOperator(V[0], U.space), None, U, V, sp, rp
 
 
 def thermalblock_vectorarray_factory(adjoint, xblocks, yblocks, diameter, seed):
-    from pymor.operators.constructions import VectorArrayOperator
-    _, _, U, V, sp, rp = thermalblock_factory(xblocks, yblocks, diameter, seed)
+    _, _, U, V, sp, rp, random_state = _thermalblock_factory(xblocks, yblocks, diameter, seed)
     op = VectorArrayOperator(U, adjoint)
     if adjoint:
         U = V
-        V = op.range.make_array(np.random.random((7, op.range.dim)))
+        V = op.range.make_array(random_state.random_sample((7, op.range.dim)))
         sp = rp
         rp = NumpyMatrixOperator(np.eye(op.range.dim) * 2)
     else:
-        U = op.source.make_array(np.random.random((7, op.source.dim)))
+        U = op.source.make_array(random_state.random_sample((7, op.source.dim)))
         sp = NumpyMatrixOperator(np.eye(op.source.dim) * 2)
     return op, None, U, V, sp, rp
 
 
 def thermalblock_vector_factory(xblocks, yblocks, diameter, seed):
-    from pymor.operators.constructions import VectorOperator
-    _, _, U, V, sp, rp = thermalblock_factory(xblocks, yblocks, diameter, seed)
+    _, _, U, V, sp, rp, random_state = _thermalblock_factory(xblocks, yblocks, diameter, seed)
     op = VectorOperator(U[0])
-    U = op.source.make_array(np.random.random((7, 1)))
+    U = op.source.make_array(random_state.random_sample((7, 1)))
     sp = NumpyMatrixOperator(np.eye(1) * 2)
     return op, None, U, V, sp, rp
 
 
 def thermalblock_vectorfunc_factory(product, xblocks, yblocks, diameter, seed):
-    from pymor.operators.constructions import VectorFunctional
-    _, _, U, V, sp, rp = thermalblock_factory(xblocks, yblocks, diameter, seed)
+    _, _, U, V, sp, rp, random_state = _thermalblock_factory(xblocks, yblocks, diameter, seed)
     op = VectorFunctional(U[0], product=sp if product else None)
     U = V
-    V = op.range.make_array(np.random.random((7, 1)))
+    V = op.range.make_array(random_state.random_sample((7, 1)))
     sp = rp
     rp = NumpyMatrixOperator(np.eye(1) * 2)
     return op, None, U, V, sp, rp
 
 
 def thermalblock_fixedparam_factory(xblocks, yblocks, diameter, seed):
-    from pymor.operators.constructions import FixedParameterOperator
     op, mu, U, V, sp, rp = thermalblock_factory(xblocks, yblocks, diameter, seed)
     return FixedParameterOperator(op, mu=mu), None, U, V, sp, rp
 
@@ -342,40 +347,36 @@ num_misc_operators = 12
 
 def misc_operator_with_arrays_and_products_factory(n):
     if n == 0:
-        from pymor.operators.constructions import ComponentProjection
-        _, _, U, V, sp, rp = numpy_matrix_operator_with_arrays_and_products_factory(100, 10, 4, 3, n)
-        op = ComponentProjection(np.random.randint(0, 100, 10), U.space)
+        random_state = get_random_state(seed=n)
+        _, _, U, V, sp, rp = numpy_matrix_operator_with_arrays_and_products_factory(100, 10, 4, 3, None,
+                                                                                    random_state=random_state)
+        op = ComponentProjection(random_state.randint(0, 100, 10), U.space)
         return op, _, U, V, sp, rp
     elif n == 1:
-        from pymor.operators.constructions import ComponentProjection
         _, _, U, V, sp, rp = numpy_matrix_operator_with_arrays_and_products_factory(100, 0, 4, 3, n)
         op = ComponentProjection([], U.space)
         return op, _, U, V, sp, rp
     elif n == 2:
-        from pymor.operators.constructions import ComponentProjection
         _, _, U, V, sp, rp = numpy_matrix_operator_with_arrays_and_products_factory(100, 3, 4, 3, n)
         op = ComponentProjection([3, 3, 3], U.space)
         return op, _, U, V, sp, rp
     elif n == 3:
-        from pymor.operators.constructions import AdjointOperator
         op, _, U, V, sp, rp = numpy_matrix_operator_with_arrays_and_products_factory(100, 20, 4, 3, n)
         op = AdjointOperator(op, with_apply_inverse=True)
         return op, _, V, U, rp, sp
     elif n == 4:
-        from pymor.operators.constructions import AdjointOperator
         op, _, U, V, sp, rp = numpy_matrix_operator_with_arrays_and_products_factory(100, 20, 4, 3, n)
         op = AdjointOperator(op, with_apply_inverse=False)
         return op, _, V, U, rp, sp
     elif 5 <= n <= 7:
-        from pymor.operators.constructions import SelectionOperator
-        from pymor.parameters.functionals import ProjectionParameterFunctional
-        op0, _, U, V, sp, rp = numpy_matrix_operator_with_arrays_and_products_factory(30, 30, 4, 3, n)
-        op1 = NumpyMatrixOperator(np.random.random((30, 30)))
-        op2 = NumpyMatrixOperator(np.random.random((30, 30)))
+        random_state = get_random_state(seed=n)
+        op0, _, U, V, sp, rp = numpy_matrix_operator_with_arrays_and_products_factory(30, 30, 4, 3, None,
+                                                                                      random_state=random_state)
+        op1 = NumpyMatrixOperator(random_state.random_sample((30, 30)))
+        op2 = NumpyMatrixOperator(random_state.random_sample((30, 30)))
         op = SelectionOperator([op0, op1, op2], ProjectionParameterFunctional('x'), [0.3, 0.6])
         return op, op.parameters.parse((n-5)/2), V, U, rp, sp
     elif n == 8:
-        from pymor.operators.block import BlockDiagonalOperator
         op0, _, U0, V0, sp0, rp0 = numpy_matrix_operator_with_arrays_and_products_factory(10, 10, 4, 3, n)
         op1, _, U1, V1, sp1, rp1 = numpy_matrix_operator_with_arrays_and_products_factory(20, 20, 4, 3, n+1)
         op2, _, U2, V2, sp2, rp2 = numpy_matrix_operator_with_arrays_and_products_factory(30, 30, 4, 3, n+2)
@@ -386,19 +387,14 @@ def misc_operator_with_arrays_and_products_factory(n):
         V = op.range.make_array([V0, V1, V2])
         return op, _, U, V, sp, rp
     elif n == 9:
-        from pymor.operators.block import BlockDiagonalOperator, BlockOperator
-        from pymor.parameters.functionals import ProjectionParameterFunctional
         op0a, _, U0, V0, sp0, rp0 = numpy_matrix_operator_with_arrays_and_products_factory(10, 10, 4, 3, n)
-        op0b, _, _, _, _, _       = numpy_matrix_operator_with_arrays_and_products_factory(10, 10, 4, 3, n)
-        op0c, _, _, _, _, _       = numpy_matrix_operator_with_arrays_and_products_factory(10, 10, 4, 3, n)
         op1, _, U1, V1, sp1, rp1  = numpy_matrix_operator_with_arrays_and_products_factory(20, 20, 4, 3, n+1)
         op2a, _, _, _, _, _       = numpy_matrix_operator_with_arrays_and_products_factory(20, 10, 4, 3, n+2)
-        op2b, _, _, _, _, _       = numpy_matrix_operator_with_arrays_and_products_factory(20, 10, 4, 3, n+2)
         op0 = (op0a * ProjectionParameterFunctional('p', 3, 0)
-               + op0b * ProjectionParameterFunctional('p', 3, 1)
-               + op0c * ProjectionParameterFunctional('p', 3, 1))
+               + op0a * ProjectionParameterFunctional('p', 3, 1)
+               + op0a * ProjectionParameterFunctional('p', 3, 1))
         op2 = (op2a * ProjectionParameterFunctional('p', 3, 0)
-               + op2b * ProjectionParameterFunctional('q', 1))
+               + op2a * ProjectionParameterFunctional('q', 1))
         op = BlockOperator([[op0, op2],
                             [None, op1]])
         mu = op.parameters.parse({'p': [1, 2, 3], 'q': 4})
@@ -408,14 +404,11 @@ def misc_operator_with_arrays_and_products_factory(n):
         V = op.range.make_array([V0, V1])
         return op, mu, U, V, sp, rp
     elif n == 10:
-        from pymor.operators.block import BlockDiagonalOperator, BlockColumnOperator
-        from pymor.parameters.functionals import ProjectionParameterFunctional
         op0, _, U0, V0, sp0, rp0 = numpy_matrix_operator_with_arrays_and_products_factory(10, 10, 4, 3, n)
         op1, _, U1, V1, sp1, rp1 = numpy_matrix_operator_with_arrays_and_products_factory(20, 20, 4, 3, n+1)
         op2a, _, _, _, _, _       = numpy_matrix_operator_with_arrays_and_products_factory(20, 10, 4, 3, n+2)
-        op2b, _, _, _, _, _       = numpy_matrix_operator_with_arrays_and_products_factory(20, 10, 4, 3, n+2)
         op2 = (op2a * ProjectionParameterFunctional('p', 3, 0)
-               + op2b * ProjectionParameterFunctional('q', 1))
+               + op2a * ProjectionParameterFunctional('q', 1))
         op = BlockColumnOperator([op2, op1])
         mu = op.parameters.parse({'p': [1, 2, 3], 'q': 4})
         sp = sp1
@@ -424,14 +417,11 @@ def misc_operator_with_arrays_and_products_factory(n):
         V = op.range.make_array([V0, V1])
         return op, mu, U, V, sp, rp
     elif n == 11:
-        from pymor.operators.block import BlockDiagonalOperator, BlockRowOperator
-        from pymor.parameters.functionals import ProjectionParameterFunctional
         op0, _, U0, V0, sp0, rp0 = numpy_matrix_operator_with_arrays_and_products_factory(10, 10, 4, 3, n)
         op1, _, U1, V1, sp1, rp1 = numpy_matrix_operator_with_arrays_and_products_factory(20, 20, 4, 3, n+1)
         op2a, _, _, _, _, _       = numpy_matrix_operator_with_arrays_and_products_factory(20, 10, 4, 3, n+2)
-        op2b, _, _, _, _, _       = numpy_matrix_operator_with_arrays_and_products_factory(20, 10, 4, 3, n+2)
         op2 = (op2a * ProjectionParameterFunctional('p', 3, 0)
-               + op2b * ProjectionParameterFunctional('q', 1))
+               + op2a * ProjectionParameterFunctional('q', 1))
         op = BlockRowOperator([op0, op2])
         mu = op.parameters.parse({'p': [1, 2, 3], 'q': 4})
         sp = BlockDiagonalOperator([sp0, sp1])
@@ -448,10 +438,9 @@ num_unpicklable_misc_operators = 1
 
 def unpicklable_misc_operator_with_arrays_and_products_factory(n):
     if n == 0:
-        from pymor.operators.numpy import NumpyGenericOperator
         op, _, U, V, sp, rp = numpy_matrix_operator_with_arrays_and_products_factory(100, 20, 4, 3, n)
         mat = op.matrix
-        op2 = NumpyGenericOperator(mapping=lambda U: mat.dot(U.T).T, adjoint_mapping=lambda U: mat.T.dot(U.T).T,
+        op2 = NumpyGenericOperator(mapping=lambda U: U.dot(mat.T), adjoint_mapping=lambda U: U.dot(mat),
                                    dim_source=100, dim_range=20, linear=True)
         return op2, _, U, V, sp, rp
     else:
@@ -2,6 +2,7 @@
 # Copyright 2013-2020 pyMOR developers and contributors. All rights reserved.
 # License: BSD 2-Clause License (http://opensource.org/licenses/BSD-2-Clause)
 
+from functools import lru_cache
 from itertools import product
 import numpy as np
 import pytest
@@ -46,11 +47,14 @@ if config.HAVE_FENICS:
     import dolfin as df
     from pymor.bindings.fenics import FenicsVectorSpace
 
-    fenics_spaces = [df.FunctionSpace(df.UnitSquareMesh(ni, ni), 'Lagrange', 1)
-                     for ni in [1, 10, 32, 100]]
+    @lru_cache(maxsize=None)
+    def fenics_space(space):
+        # the spaces are only built when needed, the finest mesh is not cheap to create
+        ni = [1, 10, 32, 100][space]
+        return FenicsVectorSpace(df.FunctionSpace(df.UnitSquareMesh(ni, ni), 'Lagrange', 1))
 
     def fenics_vector_array_factory(length, space, seed):
-        V = FenicsVectorSpace(fenics_spaces[space])
+        V = fenics_space(space)
         U = V.zeros(length)
         dim = V.dim
         np.random.seed(seed)
@@ -122,8 +126,13 @@ if config.HAVE_NGSOLVE:
 if config.HAVE_DEALII:
     from pydealii.pymor.vectorarray import DealIIVectorSpace
 
+    DEALII_spaces = {}
+
     def dealii_vector_array_factory(length, dim, seed):
-        U = DealIIVectorSpace(dim).zeros(length)
+        if dim not in DEALII_spaces:
+            DEALII_spaces[dim] = DealIIVectorSpace(dim)
+
+        U = DEALII_spaces[dim].zeros(length)
         np.random.seed(seed)
         for v, a in zip(U._list, np.random.random((length, dim))):
             v.impl[:] = a
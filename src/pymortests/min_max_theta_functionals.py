@@ -46,11 +46,21 @@ def test_max_theta_parameter_functional():
               for t in thetas]
     mu = theta.parameters.parse(1)
     mu_bar = theta.parameters.parse(mu_bar)
-    expected_value = gamma_mu_bar * np.abs(np.max(np.array([t(mu) for t in thetas])/np.array([t(mu_bar) for t in
+    expected_value = gamma_mu_bar * np.max(np.abs(np.array([t(mu) for t in thetas])/np.array([t(mu_bar) for t in
         thetas])))
     actual_value = theta.evaluate(mu)
     assert expected_value == actual_value
 
 
+def test_max_theta_parameter_functional_uses_absolute_ratios():
+    thetas = (ExpressionParameterFunctional('-3*mu[0]', {'mu': 1}),
+              1)
+    mu_bar = 1
+    gamma_mu_bar = 10
+    theta = MaxThetaParameterFunctional(thetas, mu_bar, gamma_mu_bar)
+    mu = theta.parameters.parse(-3)
+    assert theta.evaluate(mu) == gamma_mu_bar * 3
+
+
 if __name__ == "__main__":
     runmodule(filename=__file__)
@@ -2,14 +2,20 @@
 # Copyright 2013-2020 pyMOR developers and contributors. All rights reserved.
 # License: BSD 2-Clause License (http://opensource.org/licenses/BSD-2-Clause)
 
+import ast
+from copy import deepcopy
+
 from pymortests.base import runmodule
 import pytest
 
 import numpy as np
 
-from pymor.parameters.functionals import ProjectionParameterFunctional, ExpressionParameterFunctional
+from pymor.parameters.functionals import (ConstantParameterFunctional, ExpressionParameterFunctional,
+                                          ProjectionParameterFunctional, _sympy_compatible)
 from pymor.operators.constructions import LincombOperator, ZeroOperator
 from pymor.basic import NumpyVectorSpace, Mu
+from pymor.core.config import config
+from pymor.core.pickle import dumps, loads
 
 
 def test_ProjectionParameterFunctional():
@@ -99,6 +105,73 @@ def test_ExpressionParameterFunctional():
     assert hes_nu_nu == -0
 
 
+def test_ExpressionParameterFunctional_second_derivative_expressions_unchanged():
+    dict_of_d_mus = {'mu': ['200 * mu[0]', '2 * mu[0]'], 'nu': ['cos(nu[0])']}
+    dict_of_second_derivative = {
+        'mu': [{'mu': ['200', '2'], 'nu': ['0']}, {'mu': ['2', '0'], 'nu': ['0']}],
+        'nu': [{'mu': ['0', '0'], 'nu': ['-sin(nu[0])']}]
+    }
+    expected_d_mus = deepcopy(dict_of_d_mus)
+    expected_second_derivative = deepcopy(dict_of_second_derivative)
+
+    epf = ExpressionParameterFunctional('100 * mu[0]**2 + 2 * mu[1] * mu[0] + sin(nu[0])',
+                                        {'mu': 2, 'nu': 1},
+                                        'functional_with_derivative_and_second_derivative',
+                                        dict_of_d_mus, dict_of_second_derivative)
+
+    assert dict_of_d_mus == expected_d_mus
+    assert dict_of_second_derivative == expected_second_derivative
+
+    epf2 = loads(dumps(epf))
+    mu = Mu({'mu': [10, 2], 'nu': [1]})
+    for p, i in [('mu', 0), ('mu', 1), ('nu', 0)]:
+        assert epf2.d_mu(p, i).evaluate(mu) == epf.d_mu(p, i).evaluate(mu)
+        for q, j in [('mu', 0), ('mu', 1), ('nu', 0)]:
+            assert epf2.d_mu(p, i).d_mu(q, j).evaluate(mu) == epf.d_mu(p, i).d_mu(q, j).evaluate(mu)
+
+
+def test_ExpressionParameterFunctional_sympy_compatible():
+    # only expressions which sympy evaluates like NumPy are derived symbolically
+    sizes = {'mu': 2, 'nu': 1}
+    for expression in ['100 * mu[0]**2 + 2 * mu[1] * mu[0] + sin(nu)', 'arctan2(mu[0], mu[1]) / 3',
+                       '-exp(nu) + pi * e', 'sqrt(abs(mu[1]))']:
+        assert _sympy_compatible(ast.parse(expression, mode='eval'), sizes)
+    for expression in ['mu[0] ^ 2', 'mu[0] % 2', 'max(mu[0], nu)', 'np.sin(nu)', 'log(nu, 2)', 'mu[2]', 'mu[nu]',
+                       "mu['0']", 'sin', 'nu(2)', 'norm(mu)', 'mu[0] if nu else mu[1]']:
+        assert not _sympy_compatible(ast.parse(expression, mode='eval'), sizes)
+
+
+@pytest.mark.skipif(not config.HAVE_SYMPY, reason='sympy not installed')
+def test_ExpressionParameterFunctional_derived_derivatives():
+    epf = ExpressionParameterFunctional('100 * mu[0]**2 + 2 * mu[1] * mu[0] + sin(nu)', {'mu': 2, 'nu': 1})
+
+    mu = Mu({'mu': [10, 2], 'nu': [0]})
+
+    assert epf.d_mu('mu', 0).evaluate(mu) == 200 * 10 + 2 * 2
+    assert epf.d_mu('mu', 1).evaluate(mu) == 2 * 10
+    assert epf.d_mu('nu').evaluate(mu) == 1
+    assert epf.d_mu('mu', 0).d_mu('mu', 0).evaluate(mu) == 200
+    assert epf.d_mu('mu', 0).d_mu('mu', 1).evaluate(mu) == 2
+    assert epf.d_mu('mu', 1).d_mu('mu', 1).evaluate(mu) == 0
+    assert epf.d_mu('mu', 1).d_mu('nu').evaluate(mu) == 0
+    assert epf.d_mu('nu').d_mu('nu').evaluate(mu) == 0
+
+    # derivatives which cannot be expressed in terms of ExpressionParameterFunctional.functions
+    epf = ExpressionParameterFunctional('norm(mu)', {'mu': 2})
+    with pytest.raises(ValueError):
+        epf.d_mu('mu', 0)
+
+    # sympy reads `^` as power, so such expressions are not derived
+    epf = ExpressionParameterFunctional('mu[0] ^ 2', {'mu': 2})
+    with pytest.raises(ValueError):
+        epf.d_mu('mu', 0)
+
+    # vanishing derivatives are constant
+    epf = ExpressionParameterFunctional('mu[0]', {'mu': 2})
+    assert isinstance(epf.d_mu('mu', 1), ConstantParameterFunctional)
+    assert epf.d_mu('mu', 1).evaluate(mu) == 0
+
+
 def test_d_mu_of_LincombOperator():
     dict_of_d_mus = {'mu': ['100', '2 * mu[0]'], 'nu': ['cos(nu[0])']}
 
@@ -2,7 +2,12 @@
 # Copyright 2013-2020 pyMOR developers and contributors. All rights reserved.
 # License: BSD 2-Clause License (http://opensource.org/licenses/BSD-2-Clause)
 
+import numpy as np
+
 from pymor.parameters.base import Parameters
+from pymor.parameters.functionals import (ConstantParameterFunctional, ExpressionParameterFunctional,
+                                          MaxThetaParameterFunctional, MinThetaParameterFunctional,
+                                          ProjectionParameterFunctional)
 from pymortests.base import runmodule
 
 import pytest
@@ -30,5 +35,24 @@ def test_randomly(space):
         assert space.contains(value)
 
 
+def test_evaluate_many():
+    space = Parameters({'diffusion': 2, 'nu': 1}).space(0.1, 1)
+    mus = space.sample_randomly(num_samples)
+    thetas = [ProjectionParameterFunctional('diffusion', 2, 1),
+              ExpressionParameterFunctional('diffusion[0] * exp(nu[0])', {'diffusion': 2, 'nu': 1}),
+              ConstantParameterFunctional(2.)]
+    mu_bar = space.sample_randomly(1)[0]
+    functionals = thetas + [3. * thetas[0] * thetas[1] * thetas[2],
+                            MinThetaParameterFunctional(thetas, mu_bar, 0.5),
+                            MaxThetaParameterFunctional(thetas, mu_bar, 2.)]
+    for f in functionals:
+        assert np.allclose(f.evaluate_many(mus), [f.evaluate(mu) for mu in mus])
+
+
+def test_ExpressionParameterFunctional_rejects_statements():
+    with pytest.raises(SyntaxError):
+        ExpressionParameterFunctional('0)\n    import os\n    return (0', {'mu': 1})
+
+
 if __name__ == "__main__":
     runmodule(filename=__file__)
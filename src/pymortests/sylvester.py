@@ -165,3 +165,73 @@ def test_sylv_schur_W_E(n, r, p):
     ETWAr = E.T.dot(W.dot(Ar))
     CTCr = C.T.dot(Cr)
     assert fro_norm(ATWEr + ETWAr + CTCr) / fro_norm(CTCr) < 1e-10
+
+
+@pytest.mark.parametrize('n', n_list)
+@pytest.mark.parametrize('r', r_list)
+@pytest.mark.parametrize('m', m_list)
+@pytest.mark.parametrize('with_E', [False, True])
+@pytest.mark.parametrize('solve_for', ['V', 'W'])
+def test_sylv_schur_real_spectrum(n, r, m, with_E, solve_for):
+    np.random.seed(0)
+
+    if with_E:
+        A, E = diff_conv_1d_fem(n, 1, 1)
+    else:
+        A = diff_conv_1d_fd(n, 1, 1)
+        E = sps.eye(n)
+    B = np.random.randn(n, m)
+
+    Ar = np.random.randn(r, r)
+    Ar = (Ar + Ar.T) / 2
+    Ar -= r * np.eye(r)
+    Er = np.eye(r)
+    Br = np.random.randn(r, m)
+
+    Aop = NumpyMatrixOperator(A)
+    Eop = NumpyMatrixOperator(E) if with_E else None
+
+    Arop = NumpyMatrixOperator(Ar)
+    Erop = NumpyMatrixOperator(Er) if with_E else None
+
+    if solve_for == 'V':
+        Vva = solve_sylv_schur(Aop, Arop, E=Eop, Er=Erop, B=NumpyMatrixOperator(B), Br=NumpyMatrixOperator(Br))
+        V = Vva.to_numpy().T
+        AVErT = A.dot(V.dot(Er.T))
+        EVArT = E.dot(V.dot(Ar.T))
+        BBrT = B.dot(Br.T)
+        assert fro_norm(AVErT + EVArT + BBrT) / fro_norm(BBrT) < 1e-10
+    else:
+        # B and Br are used as C^T and Cr^T
+        Wva = solve_sylv_schur(Aop, Arop, E=Eop, Er=Erop, C=NumpyMatrixOperator(B.T), Cr=NumpyMatrixOperator(Br.T))
+        W = Wva.to_numpy().T
+        ATWEr = A.T.dot(W.dot(Er))
+        ETWAr = E.T.dot(W.dot(Ar))
+        CTCr = B.dot(Br.T)
+        assert fro_norm(ATWEr + ETWAr + CTCr) / fro_norm(CTCr) < 1e-10
+
+
+@pytest.mark.parametrize('n', n_list)
+@pytest.mark.parametrize('r', r_list)
+@pytest.mark.parametrize('m', m_list)
+def test_sylv_schur_V_complex_B_real_spectrum(n, r, m):
+    np.random.seed(0)
+
+    A = diff_conv_1d_fd(n, 1, 1)
+    B = np.random.randn(n, m) + 1j * np.random.randn(n, m)
+
+    Ar = np.random.randn(r, r)
+    Ar = (Ar + Ar.T) / 2
+    Ar -= r * np.eye(r)
+    Br = np.random.randn(r, m)
+
+    Aop = NumpyMatrixOperator(A)
+    Arop = NumpyMatrixOperator(Ar)
+    Brop = NumpyMatrixOperator(Br)
+
+    Vva = solve_sylv_schur(Aop, Arop, B=NumpyMatrixOperator(B), Br=Brop)
+    Vva_real = solve_sylv_schur(Aop, Arop, B=NumpyMatrixOperator(B.real), Br=Brop)
+
+    # the real part of the solution is returned, as for a complex Schur form
+    assert not np.iscomplexobj(Vva.to_numpy())
+    assert np.allclose(Vva.to_numpy(), Vva_real.to_numpy())
@@ -2,6 +2,7 @@
 # Copyright 2013-2020 pyMOR developers and contributors. All rights reserved.
 # License: BSD 2-Clause License (http://opensource.org/licenses/BSD-2-Clause)
 
+from functools import lru_cache
 from itertools import product, chain
 from numbers import Number
 
@@ -9,7 +10,9 @@ import pytest
 import numpy as np
 
 from pymor.algorithms.basic import almost_equal
+from pymor.tools.random import get_random_state
 from pymor.vectorarrays.interface import VectorSpace
+from pymor.vectorarrays.numpy import NumpyVectorSpace
 from pymortests.fixtures.vectorarray import \
     (vector_array_without_reserve, vector_array, compatible_vector_array_pair_without_reserve,
      compatible_vector_array_pair, incompatible_vector_array_pair,
@@ -41,105 +44,157 @@ def indexed(v, ind):
 
 
 def invalid_inds(v, length=None):
+    yield from _invalid_inds(len(v), length)
+
+
+@lru_cache(maxsize=None)
+def _invalid_inds(n, length):
+    # the indices only depend on the lengths, so they are computed once and shared;
+    # they must not be modified by the tests
+    return tuple(_generate_invalid_inds(n, length))
+
+
+def _generate_invalid_inds(n, length):
     yield None
     if length is None:
-        yield len(v)
-        yield [len(v)]
-        yield -len(v)-1
-        yield [-len(v)-1]
-        yield [0, len(v)]
+        yield n
+        yield [n]
+        yield -n-1
+        yield [-n-1]
+        yield [0, n]
         length = 42
     if length > 0:
-        yield [-len(v)-1] + [0, ] * (length - 1)
-        yield list(range(length - 1)) + [len(v)]
+        yield [-n-1] + [0, ] * (length - 1)
+        yield list(range(length - 1)) + [n]
 
 
 def valid_inds(v, length=None):
+    yield from _valid_inds(len(v), length)
+
+
+@lru_cache(maxsize=None)
+def _valid_inds(n, length):
+    return tuple(_generate_valid_inds(n, length))
+
+
+def _generate_valid_inds(n, length):
     if length is None:
         yield []
         yield slice(None)
-        yield slice(0, len(v))
+        yield slice(0, n)
         yield slice(0, 0)
         yield slice(-3)
-        yield slice(0, len(v), 3)
-        yield slice(0, len(v)//2, 2)
-        yield list(range(-len(v), len(v)))
-        yield list(range(int(len(v)/2)))
-        yield list(range(len(v))) * 2
+        yield slice(0, n, 3)
+        yield slice(0, n//2, 2)
+        yield list(range(-n, n))
+        yield list(range(int(n/2)))
+        yield list(range(n)) * 2
         length = 32
-    if len(v) > 0:
-        for ind in [-len(v), 0, len(v) - 1]:
+    if n > 0:
+        for ind in [-n, 0, n - 1]:
             yield ind
-        if len(v) == length:
+        if n == length:
             yield slice(None)
-        np.random.seed(len(v) * length)
-        yield list(np.random.randint(-len(v), len(v), size=length))
+        random_state = get_random_state(seed=n * length)
+        yield list(random_state.randint(-n, n, size=length))
     else:
-        if len(v) == 0:
+        if n == 0:
             yield slice(0, 0)
         yield []
 
 
 def valid_inds_of_same_length(v1, v2):
-    if len(v1) == len(v2):
+    yield from _valid_inds_of_same_length(len(v1), len(v2))
+
+
+@lru_cache(maxsize=None)
+def _valid_inds_of_same_length(n1, n2):
+    return tuple(_generate_valid_inds_of_same_length(n1, n2))
+
+
+def _generate_valid_inds_of_same_length(n1, n2):
+    if n1 == n2:
         yield slice(None), slice(None)
-        yield list(range(len(v1))), list(range(len(v1)))
-        yield (slice(0, len(v1)),) * 2
+        yield list(range(n1)), list(range(n1))
+        yield (slice(0, n1),) * 2
         yield (slice(0, 0),) * 2
         yield (slice(-3),) * 2
-        yield (slice(0, len(v1), 3),) * 2
-        yield (slice(0, len(v1)//2, 2),) * 2
+        yield (slice(0, n1, 3),) * 2
+        yield (slice(0, n1//2, 2),) * 2
     yield [], []
-    if len(v1) > 0 and len(v2) > 0:
+    if n1 > 0 and n2 > 0:
         yield 0, 0
-        yield len(v1) - 1, len(v2) - 1
-        yield -len(v1), -len(v2)
+        yield n1 - 1, n2 - 1
+        yield -n1, -n2
         yield [0], 0
-        yield (list(range(min(len(v1), len(v2))//2)),) * 2
-        np.random.seed(len(v1) * len(v2))
-        for count in np.linspace(0, min(len(v1), len(v2)), 3).astype(int):
-            yield (list(np.random.randint(-len(v1), len(v1), size=count)),
-                   list(np.random.randint(-len(v2), len(v2), size=count)))
-        yield slice(None), np.random.randint(-len(v2), len(v2), size=len(v1))
-        yield np.random.randint(-len(v1), len(v1), size=len(v2)), slice(None)
+        yield (list(range(min(n1, n2)//2)),) * 2
+        random_state = get_random_state(seed=n1 * n2)
+        n = min(n1, n2)
+        for count in (0, n // 2, n):
+            yield (list(random_state.randint(-n1, n1, size=count)),
+                   list(random_state.randint(-n2, n2, size=count)))
+        yield slice(None), random_state.randint(-n2, n2, size=n1)
+        yield random_state.randint(-n1, n1, size=n2), slice(None)
 
 
 def valid_inds_of_different_length(v1, v2):
-    if len(v1) != len(v2):
+    yield from _valid_inds_of_different_length(len(v1), len(v2))
+
+
+@lru_cache(maxsize=None)
+def _valid_inds_of_different_length(n1, n2):
+    return tuple(_generate_valid_inds_of_different_length(n1, n2))
+
+
+def _generate_valid_inds_of_different_length(n1, n2):
+    if n1 != n2:
         yield slice(None), slice(None)
-        yield list(range(len(v1))), list(range(len(v2)))
-    if len(v1) > 0 and len(v2) > 0:
-        if len(v1) > 1:
+        yield list(range(n1)), list(range(n2))
+    if n1 > 0 and n2 > 0:
+        if n1 > 1:
             yield [0, 1], 0
             yield [0, 1], [0]
             yield [-1, 0, 1], [0]
             yield slice(0, -1), []
-        if len(v2) > 1:
+        if n2 > 1:
             yield 0, [0, 1]
             yield [0], [0, 1]
-        np.random.seed(len(v1) * len(v2))
-        for count1 in np.linspace(0, len(v1), 3).astype(int):
-            count2 = np.random.randint(0, len(v2))
+        random_state = get_random_state(seed=n1 * n2)
+        for count1 in (0, n1 // 2, n1):
+            count2 = random_state.randint(0, n2)
             if count2 == count1:
                 count2 += 1
-                if count2 == len(v2):
+                if count2 == n2:
                     count2 -= 2
             if count2 >= 0:
-                yield (list(np.random.randint(-len(v1), len(v1), size=count1)),
-                       list(np.random.randint(-len(v2), len(v2), size=count2)))
+                yield (list(random_state.randint(-n1, n1, size=count1)),
+                       list(random_state.randint(-n2, n2, size=count2)))
 
 
 def invalid_ind_pairs(v1, v2):
-    for inds in valid_inds_of_different_length(v1, v2):
-        yield inds
-    for ind1 in valid_inds(v1):
-        for ind2 in invalid_inds(v2, length=v1.len_ind(ind1)):
+    yield from _invalid_ind_pairs(len(v1), len(v2))
+
+
+@lru_cache(maxsize=None)
+def _invalid_ind_pairs(n1, n2):
+    return tuple(_generate_invalid_ind_pairs(n1, n2))
+
+
+def _generate_invalid_ind_pairs(n1, n2):
+    yield from _valid_inds_of_different_length(n1, n2)
+    for ind1 in _valid_inds(n1, None):
+        for ind2 in _invalid_inds(n2, _len_ind(n1, ind1)):
             yield ind1, ind2
-    for ind2 in valid_inds(v2):
-        for ind1 in invalid_inds(v1, length=v2.len_ind(ind2)):
+    for ind2 in _valid_inds(n2, None):
+        for ind1 in _invalid_inds(n1, _len_ind(n2, ind2)):
             yield ind1, ind2
 
 
+def _len_ind(n, ind):
+    # VectorArray.len_ind only depends on the length of the array, so a cheap array of dimension 0 suffices
+    return NumpyVectorSpace(0).zeros(n).len_ind(ind)
+
+
 def ind_to_list(v, ind):
     if type(ind) is slice:
         return list(range(*ind.indices(len(v))))